@@ -4,16 +4,47 @@ Flask backend for showing PostGIS layers and exporting selected features as zipp
 """
 
 import os
-import json
+import io
 import tempfile
 import zipfile
-import shutil
+import gzip
+import subprocess
+import threading
+from contextlib import contextmanager
 from pathlib import Path
-from flask import Flask, render_template, jsonify, request, send_file
-import psycopg2
-import geopandas as gpd
+import click
+from flask import Flask, Response, render_template, jsonify, request, send_file
+from flask.json.provider import DefaultJSONProvider
+import orjson
+from psycopg2.pool import PoolError, ThreadedConnectionPool
+import numpy as np
+import pandas as pd
+from flask_compress import Compress
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson; unknown types (Decimal, dates, ...) fall back to str()."""
+    option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=str, option=self.option).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        # Emit orjson's bytes directly instead of round-tripping through str
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=str, option=self.option)
+        return self._app.response_class(body, mimetype=self.mimetype)
 
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
+
+# Compress JSON responses; /data serves its pre-gzipped cache files directly
+app.config["COMPRESS_MIMETYPES"] = ["application/json", "application/geo+json"]
+app.config["COMPRESS_LEVEL"] = 6
+app.config["COMPRESS_STREAMS"] = False
+Compress(app)
 
 # -------------------------
 # Database config (your DB)
@@ -26,6 +57,21 @@ DB_CONFIG = {
     "port": "5432"
 }
 
+# On-disk cache of full-layer GeoJSON (gzipped, one file per table); clear with `flask clear-cache`
+CACHE_DIR = Path(__file__).resolve().parent / ".cache"
+
+# Vector tile settings
+MVT_EXTENT = 4096
+WEB_MERCATOR_WIDTH = 40075016.68
+
+# Shared connection pool: avoids a new TCP + auth handshake on every request
+POOL_MAXCONN = 20
+POOL = ThreadedConnectionPool(minconn=2, maxconn=POOL_MAXCONN, **DB_CONFIG)
+# getconn() raises PoolError instead of waiting once every connection is out (e.g. held by
+# streamed /data responses); this semaphore makes callers wait for a free one instead
+POOL_SLOTS = threading.BoundedSemaphore(POOL_MAXCONN)
+POOL_WAIT_TIMEOUT = 30
+
 # -------------------------
 # Layers mapping
 # Keys are used by the frontend; table is the actual PostGIS table name.
@@ -66,20 +112,36 @@ LAYERS = {
 # -------------------------
 # Helpers
 # -------------------------
+@contextmanager
 def get_connection():
-    """Open a new psycopg2 connection from DB_CONFIG."""
-    return psycopg2.connect(
-        host=DB_CONFIG["host"],
-        dbname=DB_CONFIG["dbname"],
-        user=DB_CONFIG["user"],
-        password=DB_CONFIG["password"],
-        port=DB_CONFIG["port"]
-    )
+    """Borrow a psycopg2 connection from POOL (waiting up to POOL_WAIT_TIMEOUT s); it is returned on exit."""
+    if not POOL_SLOTS.acquire(timeout=POOL_WAIT_TIMEOUT):
+        raise PoolError("Timed out waiting for a free database connection")
+    try:
+        conn = POOL.getconn()
+        try:
+            yield conn
+        finally:
+            POOL.putconn(conn)
+    finally:
+        POOL_SLOTS.release()
+
+def pg_datasource():
+    """OGR connection string for DB_CONFIG (the password is passed via PGPASSWORD, see run_ogr2ogr)."""
+    return "PG:host={host} port={port} dbname={dbname} user={user}".format(**DB_CONFIG)
+
+def run_ogr2ogr(*args):
+    """Run ogr2ogr with DB credentials in the environment; raises RuntimeError with its stderr on failure."""
+    env = dict(os.environ, PGPASSWORD=DB_CONFIG["password"])
+    proc = subprocess.run(["ogr2ogr", *args], env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip() or "ogr2ogr failed")
 
 def fetch_geojson_from_table(table_name, geom_col="geom"):
     """
-    Build a FeatureCollection with a stable _rowid (1-based row number) included in properties.
-    This query returns a JSON object; we load it to return as Python dict later.
+    Stream a FeatureCollection with a stable _rowid (1-based row number) included in properties.
+    Returns an iterator of JSON text chunks; each feature is serialized by PostGIS and
+    read through a server-side cursor, so the full collection is never held in memory.
     """
     # Protect: only allow known tables
     allowed_tables = {v["table"] for v in LAYERS.values()}
@@ -88,29 +150,98 @@ def fetch_geojson_from_table(table_name, geom_col="geom"):
 
     sql = f"""
         SELECT jsonb_build_object(
-            'type', 'FeatureCollection',
-            'features', jsonb_agg(feature)
-        ) FROM (
-            SELECT jsonb_build_object(
-                'type', 'Feature',
-                'geometry', ST_AsGeoJSON({geom_col})::jsonb,
-                'properties', to_jsonb(t) - '{geom_col}'
-            ) AS feature
-            FROM (
-                SELECT *, row_number() OVER () AS _rowid FROM {table_name}
-            ) t
-        ) features;
+            'type', 'Feature',
+            'geometry', ST_AsGeoJSON({geom_col})::jsonb,
+            'properties', to_jsonb(t) - '{geom_col}'
+        )::text
+        FROM (
+            SELECT *, row_number() OVER () AS _rowid FROM {table_name}
+        ) t
     """
+    return _stream_feature_collection(sql)
+
+def _stream_feature_collection(sql, itersize=1000):
+    """Yield a FeatureCollection piecewise from a query returning one feature (as text) per row."""
+    with get_connection() as conn:
+        with conn.cursor(name="feat_cur") as cur:
+            cur.execute(sql)
+            # DECLARE alone does not run the query: fetch the first batch before the header so
+            # errors raised while it runs (bad geometry, casts) reach the caller's next()
+            rows = cur.fetchmany(itersize)
+            yield '{"type":"FeatureCollection","features":['
+            first = True
+            while rows:
+                for (feature,) in rows:
+                    yield feature if first else "," + feature
+                    first = False
+                rows = cur.fetchmany(itersize)
+            yield "]}"
+
+def cached_geojson_path(table_name):
+    """
+    Return the path of the gzipped full-resolution FeatureCollection for table_name, building it on a miss.
+    Only one entry per table exists, so the cache size is bounded by LAYERS.
+    The file is written to a temp name and renamed, so readers never see a partial cache entry.
+    """
+    path = CACHE_DIR / f"{table_name}.json.gz"
+    if path.exists():
+        return path
+    chunks = fetch_geojson_from_table(table_name, geom_col="geom")
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=CACHE_DIR, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6) as gz:
+            for chunk in chunks:
+                gz.write(chunk.encode("utf-8"))
+        os.replace(tmp, path)
+    except Exception:
+        os.unlink(tmp)
+        raise
+    return path
+
+def clear_geojson_cache():
+    """Delete every cached layer file."""
+    if CACHE_DIR.exists():
+        for f in CACHE_DIR.glob("*.json.gz"):
+            f.unlink()
+
+def _iter_gunzip(path, chunk_size=64 * 1024):
+    """Yield the decompressed bytes of a gzip file, for clients that do not accept gzip."""
+    with gzip.open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            yield chunk
+
+def fetch_mvt_tile(table_name, z, x, y, geom_col="geom"):
+    """
+    Return one Mapbox Vector Tile (bytes) for table_name at z/x/y.
+    Geometries are clipped to the tile and simplified to roughly one tile pixel.
+    Tile features carry no _rowid: it is numbered over the whole table, so adding it
+    would make every tile scan the full table instead of using the geom index.
+    """
+    allowed_tables = {v["table"] for v in LAYERS.values()}
+    if table_name not in allowed_tables:
+        raise ValueError("Table not recognized")
 
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(sql)
-    row = cur.fetchone()
-    cur.close()
-    conn.close()
-    if not row:
-        return {"type": "FeatureCollection", "features": []}
-    return row[0]
+    # Web Mercator metres per tile pixel (4096 px extent) at this zoom
+    tol = WEB_MERCATOR_WIDTH / (2 ** z * MVT_EXTENT)
+    sql = f"""
+        WITH bounds AS (SELECT ST_TileEnvelope(%(z)s, %(x)s, %(y)s) AS env)
+        SELECT ST_AsMVT(q, %(layer)s, {MVT_EXTENT}, 'geom') FROM (
+            SELECT ST_AsMVTGeom(
+                       ST_SimplifyPreserveTopology(ST_Transform(t.{geom_col}, 3857), %(tol)s),
+                       bounds.env, {MVT_EXTENT}, 64, true
+                   ) AS geom,
+                   to_jsonb(t) - '{geom_col}' AS props
+            FROM {table_name} t, bounds
+            WHERE t.{geom_col} && ST_Transform(bounds.env, 4326)
+        ) q
+    """
+    params = {"z": z, "x": x, "y": y, "tol": tol, "layer": table_name}
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(sql, params)
+            row = cur.fetchone()
+    return bytes(row[0]) if row and row[0] is not None else b""
 
 def fetch_attributes(table_name, limit=None):
     """
@@ -120,34 +251,31 @@ def fetch_attributes(table_name, limit=None):
     allowed_tables = {v["table"] for v in LAYERS.values()}
     if table_name not in allowed_tables:
         raise ValueError("Table not recognized")
-    conn = get_connection()
-    cur = conn.cursor()
     lim = f"LIMIT {int(limit)}" if limit else ""
     # Select * + row_number to get stable rowid
     sql = f"SELECT *, row_number() OVER () AS _rowid FROM {table_name} {lim};"
-    cur.execute(sql)
-    colnames = [d[0] for d in cur.description]
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
-    # Convert rows to list of dicts with JSON-safe values
-    rows_out = []
-    for r in rows:
-        obj = {}
-        for k, v in zip(colnames, r):
-            # If geometry column, skip: we'll not include geometry in table
-            if k == 'geom':
-                continue
-            # Convert bytes/other non-jsonable to str
-            try:
-                json.dumps(v)
-                obj[k] = v
-            except Exception:
-                obj[k] = str(v)
-        rows_out.append(obj)
-    # Remove geom from column list if present
-    cols = [c for c in colnames if c != 'geom']
-    return cols, rows_out
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(sql)
+            colnames = [d[0] for d in cur.description]
+            rows = cur.fetchall()
+    # Build the frame once; geometry is not shown in the table
+    df = pd.DataFrame(rows, columns=colnames).drop(columns=["geom"], errors="ignore")
+    # bytea values are not JSON-serializable: decode them as text
+    obj_cols = df.select_dtypes("object").columns
+    if len(obj_cols):
+        df[obj_cols] = df[obj_cols].apply(lambda col: col.map(_decode_binary))
+    # Nullable dtypes keep integer columns with NULLs as ints (Int64) instead of float64 (1 -> 1.0)
+    df = df.convert_dtypes()
+    # NaN/NaT/NA -> None so they serialize as null
+    df = df.astype(object).where(df.notna(), None)
+    return df.columns.tolist(), df.to_dict(orient="records")
+
+def _decode_binary(v):
+    """Decode bytes/memoryview cell values to str; leave everything else untouched."""
+    if isinstance(v, (bytes, memoryview)):
+        return bytes(v).decode("utf-8", errors="replace")
+    return v
 
 # -------------------------
 # Routes
@@ -160,15 +288,38 @@ def index():
 
 @app.route("/data/<layer_key>")
 def data_layer(layer_key):
-    """
-    Return GeoJSON for the requested layer key (adm0, adm1, adm2, electoral_poly, points).
-    """
+    """Return GeoJSON for the requested layer key (adm0, adm1, adm2, electoral_poly, points)."""
+    if layer_key not in LAYERS:
+        return jsonify({"error": "Unknown layer key"}), 404
+    table = LAYERS[layer_key]["table"]
+    try:
+        # Layers are static: serve the cached gzip, or its gunzipped stream for clients that
+        # don't accept gzip, under one ETag so If-None-Match works for both
+        path = cached_geojson_path(table)
+        st = path.stat()
+        etag = f"{table}-{st.st_mtime_ns}-{st.st_size}"
+        if "gzip" in request.accept_encodings:
+            resp = send_file(path, mimetype="application/json", conditional=False, etag=etag)
+            resp.headers["Content-Encoding"] = "gzip"
+        else:
+            resp = Response(_iter_gunzip(path), mimetype="application/json")
+            resp.set_etag(etag)
+        resp.headers["Vary"] = "Accept-Encoding"
+        return resp.make_conditional(request)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/tile/<layer_key>/<int:z>/<int:x>/<int:y>.pbf")
+def tile_layer(layer_key, z, x, y):
+    """Return a vector tile (ST_AsMVT) for the requested layer key; much smaller than /data for map display."""
     if layer_key not in LAYERS:
         return jsonify({"error": "Unknown layer key"}), 404
+    if not (0 <= z <= 22 and 0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        return jsonify({"error": "Invalid tile coordinates"}), 400
     table = LAYERS[layer_key]["table"]
     try:
-        geojson_obj = fetch_geojson_from_table(table, geom_col="geom")
-        return jsonify(geojson_obj)
+        tile = fetch_mvt_tile(table, z, x, y, geom_col="geom")
+        return Response(tile, mimetype="application/x-protobuf")
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -208,53 +359,62 @@ def download_selection():
 
     table = LAYERS[layer_key]["table"]
 
-    # Read entire table to a GeoDataFrame, create _rowid and subset
-    conn = get_connection()
-    try:
-        gdf = gpd.read_postgis(f"SELECT * FROM {table}", conn, geom_col="geom")
-    finally:
-        conn.close()
-
-    if gdf.empty:
-        return jsonify({"error": "Layer has no features"}), 400
-
-    gdf = gdf.reset_index(drop=True)
-    # _rowid is 1-based
-    gdf["_rowid"] = gdf.index + 1
-
-    # Validate selected indices
-    sel_valid = [int(x) for x in selected if isinstance(x, int) or (isinstance(x, str) and x.isdigit())]
-    sel_valid = [x for x in sel_valid if 1 <= x <= len(gdf)]
-    if not sel_valid:
+    # Validate selected indices (_rowid is 1-based). bool is an int subclass, and isdigit() passes
+    # strings like "²" that int() rejects; the length cap keeps int() clear of its digit limit
+    ids = (int(x) for x in selected
+           if (isinstance(x, int) and not isinstance(x, bool))
+           or (isinstance(x, str) and x.isdecimal() and len(x) <= 19))
+    # Range-check the Python ints first so huge values never reach int64 (OverflowError);
+    # ids past the end of the table simply match no row
+    upper = np.iinfo(np.int64).max
+    sel_valid = np.unique(np.fromiter((x for x in ids if 1 <= x <= upper), dtype=np.int64))
+    if not sel_valid.size:
         return jsonify({"error": "No valid selection indices"}), 400
 
-    subset = gdf[gdf["_rowid"].isin(sel_valid)].copy()
+    # Let ogr2ogr read the selection straight from PostGIS and write the shapefile itself
+    # (ids are validated ints, so inlining them is safe)
+    id_list = ",".join(map(str, sel_valid.tolist()))
+    sql = f"""
+        SELECT * FROM (
+            SELECT *, row_number() OVER () AS _rowid FROM {table}
+        ) s
+        WHERE _rowid IN ({id_list})
+    """
 
-    # Create temporary folder to write shapefile
-    tmpdir = Path(tempfile.mkdtemp(prefix="export_"))
     shp_basename = f"{table}_selection"
-    out_path = tmpdir / shp_basename
-
+    buf = io.BytesIO()
     try:
-        # geopandas writes a set of files: .shp .shx .dbf .prj
-        subset.to_file(str(out_path) + ".shp", driver="ESRI Shapefile")
-        # Zip files that begin with shp_basename
-        zip_path = tmpdir / (shp_basename + ".zip")
-        with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zf:
-            for f in tmpdir.iterdir():
-                if f.is_file() and f.name.startswith(shp_basename):
-                    zf.write(f, arcname=f.name)
-        # Send zip file
-        return send_file(str(zip_path), as_attachment=True, download_name=shp_basename + ".zip")
+        # Shapefile parts only live until they are zipped; the zip itself is built in memory,
+        # so the temp folder can be removed before the response is streamed
+        with tempfile.TemporaryDirectory(prefix="export_") as tmp:
+            tmpdir = Path(tmp)
+            # Large selections overflow the 128 KiB limit on a single argv entry (E2BIG),
+            # so the SQL goes to a file that ogr2ogr reads via -sql @<file>
+            sql_path = tmpdir / "selection.sql"
+            sql_path.write_text(sql, encoding="utf-8")
+            # ogr2ogr writes a set of files: .shp .shx .dbf .prj
+            run_ogr2ogr("-f", "ESRI Shapefile", str(tmpdir / shp_basename) + ".shp", pg_datasource(),
+                        "-sql", f"@{sql_path}")
+            # A .shx is a 100-byte header plus 8 bytes per feature: header-only means nothing matched
+            shx = tmpdir / (shp_basename + ".shx")
+            if not shx.exists() or shx.stat().st_size <= 100:
+                return jsonify({"error": "No valid selection indices"}), 400
+            # Stored, not deflated: the binary .shp barely compresses
+            with zipfile.ZipFile(buf, "w", zipfile.ZIP_STORED) as zf:
+                for f in tmpdir.iterdir():
+                    if f.is_file() and f.name.startswith(shp_basename):
+                        zf.write(f, arcname=f.name)
     except Exception as e:
         return jsonify({"error": f"Export failed: {e}"}), 500
-    finally:
-        # cleanup tempdir (do not remove immediately because send_file may still be streaming).
-        # We'll schedule deletion: best-effort immediate cleanup.
-        try:
-            shutil.rmtree(tmpdir)
-        except Exception:
-            pass
+
+    buf.seek(0)
+    return send_file(buf, as_attachment=True, download_name=shp_basename + ".zip", mimetype="application/zip")
+
+@app.cli.command("clear-cache")
+def clear_cache_command():
+    """Drop cached layer GeoJSON so the next /data request rebuilds it from PostGIS."""
+    clear_geojson_cache()
+    click.echo(f"GeoJSON cache cleared: {CACHE_DIR}")
 
 # -------------------------
 # Run
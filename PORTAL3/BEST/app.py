@@ -1,21 +1,62 @@
 import os
+import io
+import re
 import zipfile
 import tempfile
 import json
 import shutil
-from flask import Flask, render_template, jsonify, request, send_file
+import subprocess
+import threading
+import time
+import hashlib
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
+from itertools import chain
+from flask import Flask, Response, render_template, jsonify, request, send_file
+from flask.json.provider import DefaultJSONProvider
 from werkzeug.utils import secure_filename
-import psycopg2
+import orjson
 from psycopg2 import sql
+from psycopg2.pool import PoolError, ThreadedConnectionPool
 import geopandas as gpd
+import pyogrio
 from shapely.geometry import mapping
-from sqlalchemy import create_engine
+from flask_compress import Compress
+import numpy as np
 import pandas as pd
 
+# Use the vectorized pyogrio engine (Arrow batches) instead of Fiona for all file I/O
+gpd.options.io_engine = 'pyogrio'
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson; unknown types (Decimal, dates, ...) fall back to str()"""
+    option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=str, option=self.option).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        # Emit orjson's bytes directly instead of round-tripping through str
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=str, option=self.option)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 app.config['UPLOAD_FOLDER'] = 'uploads'
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
+# Compress JSON responses; streamed responses are gzipped incrementally by streaming_response()
+app.config['COMPRESS_MIMETYPES'] = ['application/json', 'application/geo+json']
+app.config['COMPRESS_LEVEL'] = 6
+app.config['COMPRESS_STREAMS'] = False
+Compress(app)
+
 # DB config
 DB_USER = 'postgres'
 DB_PASS = 'KIM7222'
@@ -24,37 +65,188 @@ DB_PORT = '5432'
 DB_NAME = 'gis_projects'
 
 DB_URL = f'postgresql://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}'
-engine = create_engine(DB_URL)
+
+# Upper bound on concurrent layer reads in /merge_layers. Each worker holds a pooled
+# connection, so keep this well below POOL_MAXCONN; extra callers wait in get_connection()
+MERGE_MAX_WORKERS = 8
+
+# Vector tile settings
+MVT_EXTENT = 4096
+WEB_MERCATOR_WIDTH = 40075016.68
+
+# Shared connection pool: avoids a new TCP + auth handshake on every request
+POOL_MAXCONN = 20
+POOL = ThreadedConnectionPool(minconn=2, maxconn=POOL_MAXCONN, user=DB_USER, password=DB_PASS,
+                              host=DB_HOST, port=DB_PORT, database=DB_NAME)
+# getconn() raises PoolError instead of waiting once every connection is out (streamed /data
+# responses, merge workers); this semaphore makes callers wait for a free one instead
+POOL_SLOTS = threading.BoundedSemaphore(POOL_MAXCONN)
+POOL_WAIT_TIMEOUT = 30
+
+@contextmanager
+def get_connection():
+    """Borrow a psycopg2 connection from POOL (waiting up to POOL_WAIT_TIMEOUT s); it is returned on exit"""
+    if not POOL_SLOTS.acquire(timeout=POOL_WAIT_TIMEOUT):
+        raise PoolError('Timed out waiting for a free database connection')
+    try:
+        conn = POOL.getconn()
+        try:
+            yield conn
+        finally:
+            POOL.putconn(conn)
+    finally:
+        POOL_SLOTS.release()
+
+def pg_datasource():
+    """OGR connection string for the DB (password is passed via PGPASSWORD, see run_ogr2ogr)"""
+    return f'PG:host={DB_HOST} port={DB_PORT} dbname={DB_NAME} user={DB_USER}'
+
+def run_ogr2ogr(*args):
+    """Runs ogr2ogr with DB credentials in the environment; raises RuntimeError with its stderr on failure"""
+    env = dict(os.environ, PGPASSWORD=DB_PASS)
+    proc = subprocess.run(['ogr2ogr', *args], env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip() or 'ogr2ogr failed')
+
+# Table names accepted in URLs and payloads (and for new uploads); always used with fullmatch.
+# Spatial tables whose names don't match are left out of the listing too, so UI and routes agree.
+TABLE_RE = re.compile(r'[a-z_][a-z0-9_]*')
+
+# Seconds before the spatial table list is re-read from geometry_columns
+TABLES_CACHE_TTL = 300
 
 # Helper: get list of spatial tables and metadata
 def get_spatial_tables():
-    """Returns dict of available PostGIS tables with basic info"""
-    conn = psycopg2.connect(user=DB_USER, password=DB_PASS, host=DB_HOST, port=DB_PORT, database=DB_NAME)
-    cur = conn.cursor()
-    # Only geometry tables with geom column (simplified)
-    cur.execute("""
-    SELECT f_table_schema, f_table_name, f_geometry_column, type 
-    FROM geometry_columns
-    WHERE f_table_schema NOT IN ('pg_catalog', 'information_schema')
-    ORDER BY f_table_name;
-    """)
+    """Returns dict of available PostGIS tables with basic info (cached, see TABLES_CACHE_TTL)"""
+    return _tables_cached(int(time.time() // TABLES_CACHE_TTL))
+
+def get_table_info(table):
+    """Returns cached metadata for table, or None if the name is malformed or not a spatial table"""
+    # Cheap regex gate first; the cached table dict is the allowlist for every SQL identifier
+    if not isinstance(table, str) or not TABLE_RE.fullmatch(table):
+        return None
+    return get_spatial_tables().get(table)
+
+@lru_cache(maxsize=1)
+def _tables_cached(token):
+    """Query geometry_columns once per cache token; colors are computed here, not per request"""
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            # Only geometry tables with geom column (simplified)
+            cur.execute("""
+            SELECT g.f_table_schema, g.f_table_name, g.f_geometry_column, g.type, g.srid,
+                   ARRAY(
+                       SELECT c.column_name::text FROM information_schema.columns c
+                       WHERE c.table_schema = g.f_table_schema AND c.table_name = g.f_table_name
+                       ORDER BY c.ordinal_position
+                   ) AS columns
+            FROM geometry_columns g
+            WHERE g.f_table_schema NOT IN ('pg_catalog', 'information_schema')
+            ORDER BY g.f_table_name;
+            """)
+            rows = cur.fetchall()
     tables = {}
-    for schema, table, geom_col, geom_type in cur.fetchall():
+    for schema, table, geom_col, geom_type, srid, columns in rows:
+        if not TABLE_RE.fullmatch(table):
+            continue
         tables[table] = {
             'schema': schema,
             'geom_col': geom_col,
             'geom_type': geom_type,
+            'srid': srid,
+            'columns': columns,
             'title': table.replace('_', ' ').title(),
             'color': assign_color(table),
-            'type': 'point' if geom_type.lower() == 'point' else 'polygon'
+            'type': 'point' if geom_type.lower() in ('point', 'multipoint') else 'polygon'
         }
-    cur.close()
-    conn.close()
     return tables
 
+def stream_feature_collection(query, itersize=1000):
+    """Yields a FeatureCollection piecewise from a query returning one feature (as text) per row"""
+    with get_connection() as conn:
+        with conn.cursor(name='feat_cur') as cur:
+            cur.execute(query)
+            # DECLARE alone does not run the query: fetch the first batch before the header so
+            # errors raised while it runs (bad geometry, casts) reach the caller's next()
+            rows = cur.fetchmany(itersize)
+            yield '{"type":"FeatureCollection","features":['
+            first = True
+            while rows:
+                for (feature,) in rows:
+                    yield feature if first else ',' + feature
+                    first = False
+                rows = cur.fetchmany(itersize)
+            yield ']}'
+
+def streaming_response(chunks, mimetype='application/json'):
+    """Wraps text chunks in a streaming Response, gzipping on the fly if the client accepts it"""
+    if 'gzip' not in request.accept_encodings:
+        return Response(chunks, mimetype=mimetype)
+
+    def gzipped():
+        z = zlib.compressobj(app.config['COMPRESS_LEVEL'], zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        for chunk in chunks:
+            data = z.compress(chunk.encode('utf-8'))
+            if data:
+                yield data
+        yield z.flush()
+
+    resp = Response(gzipped(), mimetype=mimetype)
+    resp.headers['Content-Encoding'] = 'gzip'
+    resp.headers['Vary'] = 'Accept-Encoding'
+    return resp
+
+def parse_selection(selected):
+    """Returns the valid 0-based _rowid values in selected as a sorted, de-duplicated int64 array"""
+    # bool is an int subclass, and isdigit() passes strings like '²' that int() rejects;
+    # the length cap keeps int() clear of its digit limit on absurd strings
+    ids = (int(x) for x in selected
+           if (isinstance(x, int) and not isinstance(x, bool))
+           or (isinstance(x, str) and x.isdecimal() and len(x) <= 19))
+    # Range-check the Python ints first so huge values never reach int64 (OverflowError)
+    upper = np.iinfo(np.int64).max
+    return np.unique(np.fromiter((x for x in ids if 0 <= x <= upper), dtype=np.int64))
+
+def json_ready(df):
+    """Returns df as object dtype with native Python values and None for every missing value"""
+    # Nullable dtypes keep integer columns with NULLs as ints instead of float64 (1 -> 1.0)
+    df = df.convert_dtypes()
+    # datetime64 cells are pandas Timestamps, which orjson would only str() ("2019-10-31 00:00:00");
+    # hand it plain datetime objects instead, as psycopg2 returned them
+    for col in df.select_dtypes(include=['datetime', 'datetimetz']).columns:
+        df[col] = pd.Series(df[col].dt.to_pydatetime(), index=df.index, dtype=object)
+    # NaN, NaT and pd.NA -> None so they serialize as null
+    return df.astype(object).where(df.notna(), None)
+
+def read_selected_features(table, info, sel_valid):
+    """Returns a GeoDataFrame of the rows of table whose 0-based _rowid is in sel_valid"""
+    query = sql.SQL("""
+        SELECT * FROM (
+            SELECT *, row_number() OVER () - 1 AS _rowid FROM {table}
+        ) s
+        WHERE _rowid = ANY(%(ids)s)
+    """).format(table=sql.Identifier(info['schema'], table))
+    with get_connection() as conn:
+        # read_postgis decodes the WKB geometry column in one vectorized call; uploads keep
+        # their own SRS, so label the frame with the table's SRID rather than assuming 4326
+        gdf = gpd.read_postgis(query.as_string(conn), conn, geom_col=info['geom_col'],
+                               crs=info['srid'] or None, params={'ids': sel_valid.tolist()})
+    return gdf.drop(columns=['_rowid'])
+
+def geojson_zip(gdf, basename):
+    """Writes gdf as <basename>.geojson (one batched pyogrio write) and returns it zipped in a BytesIO"""
+    buf = io.BytesIO()
+    # The temp folder is gone before the response streams; the zip lives in memory
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        geojson_path = os.path.join(tmp_dir, f'{basename}.geojson')
+        pyogrio.write_dataframe(gdf, geojson_path, driver='GeoJSON')
+        with zipfile.ZipFile(buf, 'w', zipfile.ZIP_DEFLATED, compresslevel=1) as zipf:
+            zipf.write(geojson_path, arcname=f'{basename}.geojson')
+    buf.seek(0)
+    return buf
+
 def assign_color(table_name):
     """Simple color assigner by table name hash"""
-    import hashlib
     colors = ['#e6194b','#3cb44b','#ffe119','#4363d8','#f58231','#911eb4','#46f0f0','#f032e6','#bcf60c','#fabebe']
     h = int(hashlib.md5(table_name.encode()).hexdigest(), 16)
     return colors[h % len(colors)]
@@ -68,63 +260,101 @@ def index():
 # Route: Return GeoJSON of a given table
 @app.route('/data/<table>')
 def get_layer_geojson(table):
-    tables = get_spatial_tables()
-    if table not in tables:
+    info = get_table_info(table)
+    if info is None:
         return jsonify({'error': 'Layer not found'}), 404
 
-    geom_col = tables[table]['geom_col']
+    geom_col = info['geom_col']
     try:
-        conn = psycopg2.connect(user=DB_USER, password=DB_PASS, host=DB_HOST, port=DB_PORT, database=DB_NAME)
-        cur = conn.cursor()
         query = sql.SQL("""
             SELECT jsonb_build_object(
-                'type', 'FeatureCollection',
-                'features', jsonb_agg(feature)
-            )
-            FROM (
-                SELECT jsonb_build_object(
-                    'type', 'Feature',
-                    'geometry', ST_AsGeoJSON({geom})::jsonb,
-                    'properties', to_jsonb(t) - {geom}
-                ) AS feature
-                FROM {table} t
-                LIMIT 1000
-            ) features;
+                'type', 'Feature',
+                'geometry', ST_AsGeoJSON({geom})::jsonb,
+                'properties', to_jsonb(t) - {geom_name}
+            )::text
+            FROM {table} t
+            LIMIT 1000
+        """).format(
+            geom=sql.Identifier(geom_col),
+            geom_name=sql.Literal(geom_col),
+            table=sql.Identifier(info['schema'], table)
+        )
+        chunks = stream_feature_collection(query)
+        # next() runs the query up to its first batch, so query errors still produce a JSON 500
+        head = next(chunks)
+        return streaming_response(chain([head], chunks))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Route: Return a Mapbox Vector Tile of a given table (much smaller than /data for map display)
+@app.route('/tile/<table>/<int:z>/<int:x>/<int:y>.pbf')
+def get_layer_tile(table, z, x, y):
+    info = get_table_info(table)
+    if info is None:
+        return jsonify({'error': 'Layer not found'}), 404
+    if not (0 <= z <= 22 and 0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        return jsonify({'error': 'Invalid tile coordinates'}), 400
+
+    geom_col = info['geom_col']
+    try:
+        # Clip to the tile and simplify to roughly one tile pixel (Web Mercator metres).
+        # Uploads keep their own SRS, so the tile envelope is transformed to the layer's SRID
+        query = sql.SQL("""
+            WITH bounds AS (SELECT ST_TileEnvelope(%(z)s, %(x)s, %(y)s) AS env)
+            SELECT ST_AsMVT(q, %(layer)s, %(extent)s, 'geom') FROM (
+                SELECT ST_AsMVTGeom(
+                           ST_SimplifyPreserveTopology(ST_Transform(t.{geom}, 3857), %(tol)s),
+                           bounds.env, %(extent)s, 64, true
+                       ) AS geom,
+                       to_jsonb(t) - {geom_name} AS props
+                FROM {table} t, bounds
+                WHERE t.{geom} && ST_Transform(bounds.env, %(srid)s)
+            ) q
         """).format(
             geom=sql.Identifier(geom_col),
-            table=sql.Identifier(tables[table]['schema'], table)
+            geom_name=sql.Literal(geom_col),
+            table=sql.Identifier(info['schema'], table)
         )
-        cur.execute(query)
-        result = cur.fetchone()[0]
-        cur.close()
-        conn.close()
-        return jsonify(result)
+        params = {'z': z, 'x': x, 'y': y, 'layer': table, 'extent': MVT_EXTENT, 'srid': info['srid'],
+                  'tol': WEB_MERCATOR_WIDTH / (2 ** z * MVT_EXTENT)}
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(query, params)
+                row = cur.fetchone()
+        tile = bytes(row[0]) if row and row[0] is not None else b''
+        return Response(tile, mimetype='application/x-protobuf')
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 # Route: Return attribute table JSON for DataTables
 @app.route('/attributes/<table>')
 def get_attributes(table):
-    tables = get_spatial_tables()
-    if table not in tables:
+    info = get_table_info(table)
+    if info is None:
         return jsonify({'error': 'Layer not found'}), 404
-    geom_col = tables[table]['geom_col']
+    geom_col = info['geom_col']
     try:
-        # Use pandas for attribute data excluding geom
-        sql_query = f"SELECT * FROM {tables[table]['schema']}.{table} LIMIT 1000"
-        df = pd.read_sql(sql_query, con=engine)
-        if geom_col in df.columns:
-            df = df.drop(columns=[geom_col])
-        df.fillna('', inplace=True)
-
-        columns = list(df.columns)
-        rows = df.to_dict(orient='records')
-
-        # Add _rowid for selection/highlighting, use DataFrame index
-        for i, row in enumerate(rows):
-            row['_rowid'] = i
-
-        return jsonify({'columns': columns, 'rows': rows})
+        # Attribute columns only: geometry is not shown in the table
+        attr_cols = [c for c in info['columns'] if c != geom_col]
+        query = sql.SQL("SELECT {cols} FROM {table} LIMIT 1000").format(
+            cols=sql.SQL(', ').join(map(sql.Identifier, attr_cols)) if attr_cols else sql.SQL('NULL AS _empty'),
+            table=sql.Identifier(info['schema'], table)
+        )
+        # At most 1000 rows: one query on a pooled connection, values as psycopg2 decodes them
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(query)
+                colnames = [d[0] for d in cur.description]
+                rows = cur.fetchall()
+        df = pd.DataFrame(rows, columns=colnames)
+        if not attr_cols:
+            df = df.drop(columns=['_empty'])
+
+        # Add _rowid for selection/highlighting, use row position
+        df.insert(0, '_rowid', np.arange(len(df), dtype=np.int32))
+
+        df = json_ready(df)
+        return jsonify({'columns': df.columns.tolist(), 'rows': df.to_dict(orient='records')})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -139,8 +369,8 @@ def upload_shapefile():
 
     # Sanitize new table name from form
     new_table = request.form.get('tablename', '').strip().lower()
-    if not new_table.isidentifier():
-        return jsonify({'error': 'Invalid table name. Use only letters, digits, and underscores.'}), 400
+    if not TABLE_RE.fullmatch(new_table):
+        return jsonify({'error': 'Invalid table name. Use only letters, digits, and underscores, and do not start with a digit.'}), 400
 
     # Check if table exists
     existing_tables = get_spatial_tables()
@@ -169,25 +399,30 @@ def upload_shapefile():
 
     shp_path = os.path.join(temp_dir, shp_files[0])
 
-    # Load shapefile with geopandas
+    # Check the shapefile's metadata only; the features themselves are loaded by ogr2ogr
     try:
-        gdf = gpd.read_file(shp_path)
-        if gdf.empty:
+        if pyogrio.read_info(shp_path)['features'] == 0:
             shutil.rmtree(temp_dir)
             return jsonify({'error': 'Shapefile contains no features.'}), 400
     except Exception as e:
         shutil.rmtree(temp_dir)
         return jsonify({'error': f'Error reading shapefile: {str(e)}'}), 400
 
-    # Save to PostGIS
+    # Save to PostGIS with ogr2ogr, which bulk-loads through COPY
     try:
-        # Overwrite=False - ensure no overwrite, new unique table name required
-        gdf.to_postgis(new_table, engine, if_exists='fail', index=False)
+        # No -overwrite/-append: ogr2ogr fails if the table already exists
+        run_ogr2ogr('-f', 'PostgreSQL', pg_datasource(), shp_path,
+                    '-nln', new_table,
+                    '-lco', 'GEOMETRY_NAME=geom',
+                    '-nlt', 'PROMOTE_TO_MULTI',
+                    '--config', 'PG_USE_COPY', 'YES')
     except Exception as e:
         shutil.rmtree(temp_dir)
         return jsonify({'error': f'Failed to save to PostGIS: {str(e)}'}), 500
 
     shutil.rmtree(temp_dir)
+    # New table must show up on the next request
+    _tables_cached.cache_clear()
     return jsonify({'success': f'Layer "{new_table}" uploaded successfully!'})
 
 # Route: Download selected features from a table as GeoJSON zipped
@@ -197,65 +432,30 @@ def download_selected():
     table = data.get('layer')
     selected = data.get('selected', [])
 
-    tables = get_spatial_tables()
-    if table not in tables:
+    info = get_table_info(table)
+    if info is None:
         return jsonify({'error': 'Layer not found'}), 404
-    if not selected:
+    if not isinstance(selected, list) or not selected:
         return jsonify({'error': 'No features selected'}), 400
 
-    geom_col = tables[table]['geom_col']
+    # _rowid is the 0-based row index used by the attribute table
+    sel_valid = parse_selection(selected)
+    if not sel_valid.size:
+        return jsonify({'error': 'No valid selection indices'}), 400
 
-    # Get primary key or use ctid
-    try:
-        conn = psycopg2.connect(user=DB_USER, password=DB_PASS, host=DB_HOST, port=DB_PORT, database=DB_NAME)
-        cur = conn.cursor()
-        # Use LIMIT for safety if needed
-        cur.execute(sql.SQL("SELECT column_name FROM information_schema.columns WHERE table_schema=%s AND table_name=%s AND column_name NOT IN (%s, %s) LIMIT 1"),
-                    (tables[table]['schema'], table, geom_col, 'geom'))
-        pk_col = cur.fetchone()
-        pk_col = pk_col[0] if pk_col else 'ctid'
-        cur.close()
-        conn.close()
-    except:
-        pk_col = 'ctid'
-
-    # Fetch selected rows from DB
+    # Fetch only the selected rows from DB, filtering on the row number server-side
     try:
-        query = sql.SQL("SELECT * FROM {} WHERE ctid IN (SELECT ctid FROM {} LIMIT 0)").format(
-            sql.Identifier(tables[table]['schema'], table),
-            sql.Identifier(tables[table]['schema'], table)
-        )
-        # We'll build a SQL with IN for ctid or index
-        # But since we only stored _rowid as index in attribute table, we have no unique PK
-        # So we fetch all and filter in Python instead:
-        df = pd.read_sql(f"SELECT * FROM {tables[table]['schema']}.{table}", con=engine)
-        geom = tables[table]['geom_col']
-        if geom in df.columns:
-            geom_colname = geom
-        else:
-            geom_colname = None
-
-        # Filter by row index (_rowid)
-        filtered = df.iloc[selected]
-        if geom_colname:
-            gdf = gpd.GeoDataFrame(filtered, geometry=geom_colname, crs='EPSG:4326')
-        else:
-            gdf = gpd.GeoDataFrame(filtered)
+        gdf = read_selected_features(table, info, sel_valid)
     except Exception as e:
         return jsonify({'error': f'Failed to fetch selected features: {str(e)}'}), 500
+    if gdf.empty:
+        return jsonify({'error': 'No valid selection indices'}), 400
 
     # Export to GeoJSON and ZIP
     try:
-        tmp_dir = tempfile.mkdtemp()
-        geojson_path = os.path.join(tmp_dir, f"{table}_selection.geojson")
-        gdf.to_file(geojson_path, driver='GeoJSON')
-
-        zip_path = os.path.join(tmp_dir, f"{table}_selection.zip")
-        with zipfile.ZipFile(zip_path, 'w') as zipf:
-            zipf.write(geojson_path, arcname=f"{table}_selection.geojson")
-
-        # Send file and cleanup later
-        return send_file(zip_path, as_attachment=True)
+        buf = geojson_zip(gdf, f"{table}_selection")
+        return send_file(buf, as_attachment=True, download_name=f"{table}_selection.zip",
+                         mimetype='application/zip')
     except Exception as e:
         return jsonify({'error': f'Failed to create zip: {str(e)}'}), 500
 
@@ -268,37 +468,43 @@ def merge_layers():
         return jsonify({'error': 'No layers selected'}), 400
 
     try:
-        merged_gdfs = []
+        jobs = []
         for layer_info in layers:
             table = layer_info.get('layer')
             selected = layer_info.get('selected', [])
             if not table or not selected:
                 continue
-            tables = get_spatial_tables()
-            if table not in tables:
+            info = get_table_info(table)
+            if info is None:
+                continue
+            sel_valid = parse_selection(selected)
+            if not sel_valid.size:
                 continue
-            geom_col = tables[table]['geom_col']
-            df = pd.read_sql(f"SELECT * FROM {tables[table]['schema']}.{table}", con=engine)
-            if geom_col in df.columns:
-                gdf = gpd.GeoDataFrame(df, geometry=geom_col, crs='EPSG:4326')
-            else:
-                gdf = gpd.GeoDataFrame(df)
-            filtered = gdf.iloc[selected]
-            merged_gdfs.append(filtered)
+            jobs.append((table, info, sel_valid))
 
-        if not merged_gdfs:
+        if not jobs:
             return jsonify({'error': 'No valid selected features'}), 400
 
-        result_gdf = gpd.GeoDataFrame(pd.concat(merged_gdfs, ignore_index=True))
-        tmp_dir = tempfile.mkdtemp()
-        geojson_path = os.path.join(tmp_dir, f"merged_selection.geojson")
-        result_gdf.to_file(geojson_path, driver='GeoJSON')
-
-        zip_path = os.path.join(tmp_dir, f"merged_selection.zip")
-        with zipfile.ZipFile(zip_path, 'w') as zipf:
-            zipf.write(geojson_path, arcname="merged_selection.geojson")
+        # Read layers concurrently; each worker borrows its own pooled connection
+        with ThreadPoolExecutor(max_workers=min(MERGE_MAX_WORKERS, len(jobs))) as ex:
+            futs = [ex.submit(read_selected_features, *job) for job in jobs]
+            merged_gdfs = [gdf for gdf in (f.result() for f in futs) if not gdf.empty]
+        if not merged_gdfs:
+            return jsonify({'error': 'No valid selected features'}), 400
 
-        return send_file(zip_path, as_attachment=True)
+        # Same active geometry name and CRS everywhere (layers are reprojected to the first
+        # one's SRS), so pd.concat itself returns a GeoDataFrame and no re-wrap is needed
+        crs = merged_gdfs[0].crs
+        for i, gdf in enumerate(merged_gdfs):
+            if gdf.geometry.name != 'geom':
+                gdf = gdf.rename_geometry('geom')
+            if gdf.crs != crs:
+                gdf = gdf.to_crs(crs)
+            merged_gdfs[i] = gdf
+        result_gdf = pd.concat(merged_gdfs, ignore_index=True)
+        buf = geojson_zip(result_gdf, 'merged_selection')
+        return send_file(buf, as_attachment=True, download_name='merged_selection.zip',
+                         mimetype='application/zip')
     except Exception as e:
         return jsonify({'error': f'Failed to merge layers: {str(e)}'}), 500
 